@@ -21,11 +21,27 @@ from avalanche.benchmarks.utils.classification_dataset import (
 from avalanche.benchmarks.utils.transform_groups import XTransform, YTransform
 
 
+# Deprecated constructors may be called in tight loops (e.g. one subset per
+# online experience): warn only the first time each of them is called.
+_WARNED = {
+    "dataset": False,
+    "subset": False,
+    "tensor": False,
+    "concat": False,
+}
+
+
+def _warn_once(key: str, message: str):
+    if not _WARNED[key]:
+        warnings.warn(message, DeprecationWarning, stacklevel=3)
+        _WARNED[key] = True
+
+
 def AvalanceDataset():
-    warnings.warn(
+    _warn_once(
+        "dataset",
         "AvalancheDataset has been deprecated and it will be removed in 0.4. "
         "Use `avalanche.benchmarks.ClassificationDataset` instead.`",
-        DeprecationWarning,
     )
 
 
@@ -42,10 +58,10 @@ def AvalancheSubset(
     targets: Optional[Sequence[TTargetType]] = None,
     collate_fn: Optional[Callable[[List], Any]] = None,
 ):
-    warnings.warn(
+    _warn_once(
+        "subset",
         "AvalancheDataset has been deprecated and it will be removed in 0.4. "
         "Please use `AvalancheDataset` `subset` method to create subsets.`",
-        DeprecationWarning,
     )
     return classification_subset(
         dataset,
@@ -71,11 +87,11 @@ def AvalancheTensorDataset(
     targets: Optional[Union[Sequence[TTargetType], int]] = None,
     collate_fn: Optional[Callable[[List], Any]] = None,
 ):
-    warnings.warn(
+    _warn_once(
+        "tensor",
         "AvalancheDataset has been deprecated and it will be removed in 0.4. "
         "Please use `avalanche.benchmarks.make_tensor_classification_dataset` "
         "instead.`",
-        DeprecationWarning,
     )
     return make_tensor_classification_dataset(
         dataset_tensors,
@@ -105,14 +121,17 @@ def AvalancheConcatDataset(
     ]] = None,
     collate_fn: Optional[Callable[[List], Any]] = None,
 ):
-    warnings.warn(
+    _warn_once(
+        "concat",
         "AvalancheDataset has been deprecated and it will be removed in 0.4. "
         "Please use `AvalancheDataset` `concat` method to concatenate "
         "datasets.`",
-        DeprecationWarning,
     )
+    if not isinstance(datasets, (list, tuple)):
+        # datasets is iterated more than once
+        datasets = list(datasets)
     return concat_classification_datasets(
-        list(datasets),
+        datasets,
         transform=transform,
         target_transform=target_transform,
         transform_groups=transform_groups,
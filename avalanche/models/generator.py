@@ -15,13 +15,15 @@ and their respective helper functions.
 
 """
 
+import warnings
 from abc import abstractmethod
+from functools import reduce
+from operator import mul
 from typing import Union
-from matplotlib import transforms
 import torch
 import torch.nn as nn
-from torchvision import transforms
-from avalanche.models.utils import MLP, Flatten
+import torch.nn.functional as F
+from avalanche.models.utils import MLP
 from avalanche.models.base_model import BaseModel
 
 
@@ -58,9 +60,9 @@ class VAEMLPEncoder(nn.Module):
 
     def __init__(self, shape, latent_dim=128):
         super(VAEMLPEncoder, self).__init__()
-        flattened_size = torch.Size(shape).numel()
+        flattened_size = reduce(mul, shape, 1)
         self.encode = nn.Sequential(
-            Flatten(),
+            nn.Flatten(),
             nn.Linear(in_features=flattened_size, out_features=400),
             nn.BatchNorm1d(400),
             nn.LeakyReLU(),
@@ -77,28 +79,36 @@ class VAEMLPDecoder(nn.Module):
     Decoder part of the VAE. Reverses Encoder.
 
     :param shape: Shape of output: (channels, height, width).
-    :param nhid: Dimension of input.
+    :param nhid: Dimension of input. If the decoder is called with a
+        condition `y`, it must include the dimension of `y`.
     """
 
     def __init__(self, shape, nhid=16):
         super(VAEMLPDecoder, self).__init__()
-        flattened_size = torch.Size(shape).numel()
+        flattened_size = reduce(mul, shape, 1)
         self.shape = shape
         self.decode = nn.Sequential(
             MLP([nhid, 64, 128, 256, flattened_size], last_activation=False),
             nn.Sigmoid(),
         )
-        self.invTrans = transforms.Compose(
-            [transforms.Normalize((0.1307,), (0.3081,))]
+        # Normalization applied to the output, kept as buffers so that
+        # it is a single pointwise op that can be fused with the sigmoid.
+        self.register_buffer(
+            "inv_mean", torch.tensor(0.1307), persistent=False
+        )
+        self.register_buffer(
+            "inv_std", torch.tensor(0.3081), persistent=False
         )
 
     def forward(self, z, y=None):
-        if y is None:
-            return self.invTrans(self.decode(z).view(-1, *self.shape))
-        else:
-            return self.invTrans(
-                self.decode(torch.cat((z, y), dim=1)).view(-1, *self.shape)
-            )
+        # torch.compile specializes on `y is None`, the branch does not
+        # break the graph.
+        if y is not None:
+            z = torch.cat((z, y), dim=1)
+        return self._normalize(self.decode(z))
+
+    def _normalize(self, x):
+        return (x.view(-1, *self.shape) - self.inv_mean) / self.inv_std
 
 
 class MlpVAE(Generator, nn.Module):
@@ -119,12 +129,19 @@ class MlpVAE(Generator, nn.Module):
             shape,
             nhid=16,
             n_classes=10,
-            device: Union[str, torch.device] = "cpu"):
+            device: Union[str, torch.device] = "cpu",
+            compile_modules: bool = False):
         """
         :param shape: Shape of each input sample
         :param nhid: Dimension of latent space of Encoder.
         :param n_classes: Number of classes -
                         defines classification head's dimension
+        :param device: Device of the generated samples.
+        :param compile_modules: If True and `device` is a CUDA device,
+                        compile encoder and decoder with `torch.compile`
+                        (`mode="max-autotune"`). Requires Triton. Each new
+                        batch size triggers a new compilation.
+                        Defaults to False.
         """
         super(MlpVAE, self).__init__()
         self.dim = nhid
@@ -137,6 +154,15 @@ class MlpVAE(Generator, nn.Module):
         self.calc_logvar = MLP([128, nhid], last_activation=False)
         self.classification = MLP([128, n_classes], last_activation=False)
         self.decoder = VAEMLPDecoder(shape, nhid)
+        # Latent samples of generate(), refilled in-place at each call
+        # when grad is disabled.
+        self.register_buffer("_gen_buf", torch.empty(0), persistent=False)
+        if compile_modules and self.device.type == "cuda" \
+                and hasattr(nn.Module, "compile"):
+            # Fuse the many small Linear/BatchNorm/activation kernels.
+            # Modules are compiled in-place to keep state_dict keys.
+            self.encoder.compile(mode="max-autotune", fullgraph=True)
+            self.decoder.compile(mode="max-autotune", fullgraph=True)
 
     def get_features(self, x):
         """
@@ -150,11 +176,16 @@ class MlpVAE(Generator, nn.Module):
         Output is either a single sample if batch_size=None,
         else it is a batch of samples of size "batch_size".
         """
-        z = (
-            torch.randn((batch_size, self.dim)).to(self.device)
-            if batch_size
-            else torch.randn((1, self.dim)).to(self.device)
-        )
+        z_shape = (batch_size if batch_size else 1, self.dim)
+        if torch.is_grad_enabled():
+            # The decoder saves `z` for the backward: refilling the buffer
+            # would break the backward of the previous samples.
+            z = torch.randn(z_shape, device=self._gen_buf.device,
+                            dtype=self._gen_buf.dtype)
+        else:
+            if self._gen_buf.shape != z_shape:
+                self._gen_buf = self._gen_buf.new_empty(z_shape)
+            z = self._gen_buf.normal_()
         res = self.decoder(z)
         if not batch_size:
             res = res.squeeze(0)
@@ -164,8 +195,8 @@ class MlpVAE(Generator, nn.Module):
         """
         VAE 'reparametrization trick'
         """
-        eps = torch.randn(mean.shape).to(self.device)
-        sigma = 0.5 * torch.exp(logvar)
+        eps = torch.randn_like(mean)
+        sigma = torch.exp(0.5 * logvar)
         return mean + eps * sigma
 
     def forward(self, x):
@@ -180,12 +211,6 @@ class MlpVAE(Generator, nn.Module):
         return self.decoder(z), mean, logvar
 
 
-# Loss functions
-BCE_loss = nn.BCELoss(reduction="sum")
-MSE_loss = nn.MSELoss(reduction="sum")
-CE_loss = nn.CrossEntropyLoss()
-
-
 def VAE_loss(X, forward_output):
     """
     Loss function of a VAE using mean squared error for reconstruction loss.
@@ -198,10 +223,61 @@ def VAE_loss(X, forward_output):
                 mean of the VAE output distribution,
                 logvar of the VAE output distribution)
     """
+    global _compiled_vae_loss, _use_compiled_vae_loss
+
     X_hat, mean, logvar = forward_output
-    reconstruction_loss = MSE_loss(X_hat, X)
-    KL_divergence = 0.5 * torch.sum(-1 - logvar + torch.exp(logvar) + mean ** 2)
+    if X.is_cuda and _use_compiled_vae_loss:
+        try:
+            if _compiled_vae_loss is None:
+                # Compiled on the first call, so that importing avalanche
+                # does not import torch._dynamo.
+                _compiled_vae_loss = torch.compile(_vae_loss, dynamic=True)
+            return _compiled_vae_loss(X, X_hat, mean, logvar)
+        except Exception:
+            # Errors caused by the inputs are raised again here
+            loss = _get_scripted_vae_loss()(X, X_hat, mean, logvar)
+            warnings.warn(
+                "torch.compile failed for VAE_loss (e.g. Triton is not "
+                "installed or the platform is not supported). Falling back "
+                "to the TorchScript version."
+            )
+            _compiled_vae_loss = None
+            _use_compiled_vae_loss = False
+            return loss
+    return _get_scripted_vae_loss()(X, X_hat, mean, logvar)
+
+
+def _vae_loss(
+    X: torch.Tensor,
+    X_hat: torch.Tensor,
+    mean: torch.Tensor,
+    logvar: torch.Tensor,
+) -> torch.Tensor:
+    reconstruction_loss = F.mse_loss(X_hat, X, reduction="sum")
+    # expm1(logvar) == exp(logvar) - 1
+    KL_divergence = 0.5 * torch.sum(torch.expm1(logvar) + mean * mean - logvar)
     return reconstruction_loss + KL_divergence
 
 
+def _get_scripted_vae_loss():
+    """Scripts `_vae_loss` on the first call and caches the result."""
+    global _scripted_vae_loss
+    if _scripted_vae_loss is None:
+        _scripted_vae_loss = torch.jit.script(_vae_loss)
+    return _scripted_vae_loss
+
+
+# Used for CPU inputs, for CUDA inputs on torch builds without
+# torch.compile, and after torch.compile failed. The TorchScript fuser
+# inlines the elementwise ops. Scripted by VAE_loss on the first call,
+# so that importing avalanche does not compile it.
+_scripted_vae_loss = None
+
+# On CUDA, the reconstruction and KL reductions are fused in a single kernel.
+# Built by VAE_loss on the first CUDA call. Not used if torch.compile is not
+# available or failed on a previous call.
+_compiled_vae_loss = None
+_use_compiled_vae_loss = hasattr(torch, "compile")
+
+
 __all__ = ["MlpVAE", "VAE_loss"]
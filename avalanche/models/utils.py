@@ -2,7 +2,6 @@ from avalanche.benchmarks.utils import make_classification_dataset
 from avalanche.models.dynamic_modules import MultiTaskModule, DynamicModule
 import torch.nn as nn
 from torch.nn.parallel import DistributedDataParallel
-from collections import OrderedDict
 
 from avalanche.benchmarks.scenarios import CLExperience
 
@@ -99,17 +98,17 @@ class MLP(nn.Module):
 
     def __init__(self, hidden_size, last_activation=True):
         super(MLP, self).__init__()
-        q = []
-        for i in range(len(hidden_size) - 1):
-            in_dim = hidden_size[i]
+        # Layers are added in-place, keeping their names so that
+        # existing state_dicts can still be loaded.
+        self.mlp = nn.Sequential()
+        n_layers = len(hidden_size) - 1
+        for i in range(n_layers):
             out_dim = hidden_size[i + 1]
-            q.append(("Linear_%d" % i, nn.Linear(in_dim, out_dim)))
-            if (i < len(hidden_size) - 2) or (
-                (i == len(hidden_size) - 2) and (last_activation)
-            ):
-                q.append(("BatchNorm_%d" % i, nn.BatchNorm1d(out_dim)))
-                q.append(("ReLU_%d" % i, nn.ReLU(inplace=True)))
-        self.mlp = nn.Sequential(OrderedDict(q))
+            self.mlp.add_module(
+                f"Linear_{i}", nn.Linear(hidden_size[i], out_dim))
+            if i < n_layers - 1 or last_activation:
+                self.mlp.add_module(f"BatchNorm_{i}", nn.BatchNorm1d(out_dim))
+                self.mlp.add_module(f"ReLU_{i}", nn.ReLU(inplace=True))
 
     def forward(self, x):
         return self.mlp(x)
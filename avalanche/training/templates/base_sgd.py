@@ -117,6 +117,11 @@ class BaseSGDTemplate(
         self.retain_graph: bool = False
         """ Retain graph when calling loss.backward(). """
 
+        self.cuda_graph: bool = False
+        """ Capture the training iteration in a CUDA Graph and replay it.
+        Only used when training on a CUDA device. See
+        :class:`~avalanche.training.templates.update_type.SGDUpdate`. """
+
         if evaluator is None:
             evaluator = EvaluationPlugin()
         elif callable(evaluator):
@@ -167,6 +172,8 @@ class BaseSGDTemplate(
 
         self._stop_training = False
 
+        self._cuda_graph_state: Optional[dict] = None
+
     def train(self,
               experiences: Union[TDatasetExperience,
                                  Iterable[TDatasetExperience]],
@@ -270,6 +277,7 @@ class BaseSGDTemplate(
         self.mbatch = None
         self.mb_output = None
         self.loss = self._make_empty_loss()
+        self._cuda_graph_state = None
 
     def _eval_cleanup(self):
         super()._eval_cleanup()
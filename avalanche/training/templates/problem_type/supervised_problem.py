@@ -44,10 +44,14 @@ class SupervisedProblem(SupervisedStrategyProtocol):
         assert mbatch is not None
         assert len(mbatch) >= 3
         
+        # Host-to-device copies from pinned memory can overlap with the
+        # computation. Copies towards the host must stay synchronous.
+        non_blocking = self.device.type == 'cuda'
         if isinstance(mbatch, tuple):
             mbatch = list(mbatch)
         for i in range(len(mbatch)):
-            self.mbatch[i] = mbatch[i].to(self.device)  # type: ignore
+            self.mbatch[i] = mbatch[i].to(  # type: ignore
+                self.device, non_blocking=non_blocking)
 
 
 __all__ = [
@@ -61,6 +61,10 @@ class SGDStrategyProtocol(
 
     _criterion: Module
 
+    cuda_graph: bool
+
+    _cuda_graph_state: Optional[dict]
+
     def forward(self) -> TMBoutput:
         ...
     
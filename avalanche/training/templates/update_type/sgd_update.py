@@ -1,16 +1,45 @@
+import warnings
 
+import torch
+from torch.nn.modules.batchnorm import _BatchNorm
+
+from avalanche.core import BaseSGDPlugin
 from avalanche.training.templates.strategy_mixin_protocol \
     import SGDStrategyProtocol
 
 
+CUDA_GRAPH_WARMUP_ITERS = 3
+""" Number of eager iterations run on a side stream before the capture. """
+
+_CUDA_GRAPH_BYPASSED_HOOKS = (
+    'before_forward',
+    'after_forward',
+    'before_backward',
+    'after_backward',
+    'before_update',
+    'after_update',
+)
+""" Plugin hooks that cannot change the computation of a replayed graph. """
+
+
 class SGDUpdate(SGDStrategyProtocol):
-    
+
     def training_epoch(self, **kwargs):
         """Training epoch.
 
         :param kwargs:
         :return:
         """
+        use_cuda_graph = self.cuda_graph and self.device.type == 'cuda'
+        if use_cuda_graph:
+            reason = self._cuda_graph_unsupported_reason()
+            if reason is not None:
+                warnings.warn(
+                    f"CUDA Graph training is not supported: {reason}. "
+                    f"Falling back to eager training."
+                )
+                use_cuda_graph = False
+
         for self.mbatch in self.dataloader:
             if self._stop_training:
                 break
@@ -18,27 +47,309 @@ class SGDUpdate(SGDStrategyProtocol):
             self._unpack_minibatch()
             self._before_training_iteration(**kwargs)
 
-            self.optimizer.zero_grad()
-            self.loss = self._make_empty_loss()
+            if use_cuda_graph:
+                self._cuda_graph_training_iteration(**kwargs)
+            else:
+                self._training_iteration(**kwargs)
 
-            # Forward
-            self._before_forward(**kwargs)
-            self.mb_output = self.forward()
-            self._after_forward(**kwargs)
+            self._after_training_iteration(**kwargs)
 
-            # Loss & Backward
-            self.loss += self.criterion()
+    def _training_iteration(self, **kwargs):
+        """Eager forward, backward and update on the current mini-batch."""
+        self.optimizer.zero_grad(set_to_none=True)
+        self.loss = self._make_empty_loss()
 
-            self._before_backward(**kwargs)
-            self.backward()
-            self._after_backward(**kwargs)
+        # Forward
+        self._before_forward(**kwargs)
+        self.mb_output = self.forward()
+        self._after_forward(**kwargs)
 
-            # Optimization step
-            self._before_update(**kwargs)
-            self.optimizer_step()
-            self._after_update(**kwargs)
+        # Loss & Backward
+        self.loss += self.criterion()
 
-            self._after_training_iteration(**kwargs)
+        self._before_backward(**kwargs)
+        self.backward()
+        self._after_backward(**kwargs)
+
+        # Optimization step
+        self._before_update(**kwargs)
+        self.optimizer_step()
+        self._after_update(**kwargs)
+
+    def _cuda_graph_training_iteration(self, **kwargs):
+        """Training iteration replayed from a captured CUDA Graph.
+
+        The first :data:`CUDA_GRAPH_WARMUP_ITERS` iterations run eagerly on
+        a side stream. The next one captures forward, loss, backward and
+        optimizer step in a graph, which is then replayed for every
+        mini-batch with the captured shapes. The graph is captured again
+        when the optimized parameters or the optimizer state are replaced,
+        or when a hyperparameter of the optimizer (e.g. the learning rate
+        changed by a scheduler) changes.
+
+        If the default supervised criterion is used with a `mean` or `sum`
+        reduction and no class weights (e.g. `CrossEntropyLoss()`), and the
+        model has no batch normalization layers in train mode, smaller
+        mini-batches (e.g. the last one of an epoch) are padded to the
+        captured size by repeating their samples, and the padded samples
+        are masked out of the loss. Other mini-batches with a different
+        shape are trained eagerly.
+
+        Plugin callbacks are triggered outside of the graph. Strategies
+        with plugins that override the forward, backward or update hooks,
+        or that override `training_epoch`, `backward` or `optimizer_step`,
+        are trained eagerly (see :meth:`_cuda_graph_unsupported_reason`),
+        as are optimizers that do not support graph capture (e.g. `Adam`
+        without `capturable=True`). The model forward must not synchronize
+        with the host.
+        """
+        state = self._cuda_graph_state
+        if state is None or not self._cuda_graph_key_matches(state['key']):
+            state = {
+                'key': self._cuda_graph_key(),
+                'warmup_iters': 0,
+                'graph': None,
+                'static_mb_size': None,
+                'static_mbatch': None,
+                'loss_mask': None,
+                'mask_mb_size': None,
+                'static_output': None,
+                'static_loss': None,
+            }
+            self._cuda_graph_state = state
+
+        if state['warmup_iters'] < CUDA_GRAPH_WARMUP_ITERS:
+            side_stream = torch.cuda.Stream()
+            side_stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(side_stream):
+                self._training_iteration(**kwargs)
+            torch.cuda.current_stream().wait_stream(side_stream)
+            state['warmup_iters'] += 1
+            return
+
+        if state['graph'] is None:
+            self._capture_cuda_graph(state)
+        elif not self._fits_static_mbatch(state):
+            self._training_iteration(**kwargs)
+            return
+
+        mbatch = self.mbatch
+        assert mbatch is not None
+        mb_size = mbatch[0].shape[0]
+        self._copy_to_static_mbatch(state)
+
+        self._before_forward(**kwargs)
+        state['graph'].replay()
+        # Plugins and metrics get the mini-batch from the dataloader and
+        # copies of the outputs: the static buffers of the graph are
+        # overwritten by the next replay. Padded samples are left out.
+        self.mbatch = mbatch
+        self.mb_output = state['static_output'][:mb_size].clone()
+        self.loss = state['static_loss'].clone()
+        self._after_forward(**kwargs)
+
+        self._before_backward(**kwargs)
+        self._after_backward(**kwargs)
+
+        self._before_update(**kwargs)
+        self._after_update(**kwargs)
+
+    def _cuda_graph_unsupported_reason(self):
+        """Why the training iteration cannot be replayed from a graph.
+
+        :return: a description of the reason, None if graphs can be used.
+        """
+        from avalanche.training.templates.base_sgd import BaseSGDTemplate
+
+        if type(self).training_epoch is not SGDUpdate.training_epoch:
+            return "the strategy overrides `training_epoch`"
+        for method_name in ('backward', 'optimizer_step'):
+            if getattr(type(self), method_name) is not \
+                    getattr(BaseSGDTemplate, method_name):
+                return f"the strategy overrides `{method_name}`"
+
+        for plugin in self.plugins:
+            for hook_name in _CUDA_GRAPH_BYPASSED_HOOKS:
+                hook = getattr(type(plugin), hook_name, None)
+                if hook is not None and \
+                        hook is not getattr(BaseSGDPlugin, hook_name):
+                    return f"plugin {type(plugin).__name__} overrides " \
+                           f"`{hook_name}`"
+
+        # e.g. Adam and AdamW, whose step synchronizes with the host
+        # unless they are created with `capturable=True`
+        if any('capturable' in group and not group['capturable']
+               for group in self.optimizer.param_groups):
+            return f"{type(self.optimizer).__name__} is not created " \
+                   f"with `capturable=True`"
+        return None
+
+    def _capture_cuda_graph(self, state):
+        """Captures forward, loss, backward and update in a CUDA Graph.
+
+        Static buffers shaped as the current mini-batch are allocated
+        once; the graph reads its inputs from them at each replay.
+        """
+        mbatch = self.mbatch
+        assert mbatch is not None
+        state['static_mb_size'] = mbatch[0].shape[0]
+        state['static_mbatch'] = [torch.empty_like(el) for el in mbatch]
+        if self._cuda_graph_supports_padding():
+            state['loss_mask'] = torch.ones(
+                state['static_mb_size'], device=self.device)
+            state['mask_mb_size'] = state['static_mb_size']
+        self.mbatch = state['static_mbatch']
+
+        try:
+            self.optimizer.zero_grad(set_to_none=True)
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph):
+                self.mb_output = self.forward()
+                if state['loss_mask'] is None:
+                    self.loss = self.criterion()
+                else:
+                    self.loss = self._masked_criterion(state['loss_mask'])
+                self.backward()
+                self.optimizer_step()
+        finally:
+            # the static buffers are not initialized if the capture fails
+            self.mbatch = mbatch
+
+        state['graph'] = graph
+        state['static_output'] = self.mb_output
+        state['static_loss'] = self.loss
+
+    def _cuda_graph_supports_padding(self):
+        """Whether padded samples can be masked out of the computation.
+
+        Masking needs the per-sample losses of the default supervised
+        criterion. Padded samples would also alter the statistics of
+        batch normalization layers in train mode.
+        """
+        from avalanche.training.templates.problem_type import \
+            SupervisedProblem
+
+        if getattr(type(self), 'criterion', None) is not \
+                SupervisedProblem.criterion:
+            return False
+
+        criterion = self._criterion
+        if getattr(criterion, 'reduction', None) not in ('mean', 'sum') \
+                or getattr(criterion, 'weight', None) is not None:
+            return False
+
+        return not any(isinstance(m, _BatchNorm) and m.training
+                       for m in self.model.modules())
+
+    def _masked_criterion(self, loss_mask):
+        """Criterion ignoring the samples where `loss_mask` is 0."""
+        reduction = self._criterion.reduction
+        self._criterion.reduction = 'none'
+        try:
+            loss = self.criterion()
+        finally:
+            self._criterion.reduction = reduction
+
+        weights = loss_mask.view(-1, *([1] * (loss.dim() - 1)))
+        masked_loss = (loss * weights).sum()
+        if reduction == 'mean':
+            weights = weights.expand_as(loss)
+            # as in the criterion, ignored targets are not averaged. Only
+            # class index targets are ignored, not class probabilities.
+            ignore_index = getattr(self._criterion, 'ignore_index', None)
+            targets = self.mb_y
+            if ignore_index is not None \
+                    and not targets.is_floating_point() \
+                    and targets.shape == loss.shape:
+                weights = weights * (targets != ignore_index)
+            masked_loss = masked_loss / weights.sum()
+        return masked_loss
+
+    def _copy_to_static_mbatch(self, state):
+        mbatch = self.mbatch
+        assert mbatch is not None
+        mb_size = mbatch[0].shape[0]
+        for static_el, el in zip(state['static_mbatch'], mbatch):
+            static_el[:mb_size].copy_(el, non_blocking=True)
+            if mb_size < len(static_el):
+                pad_idxs = torch.arange(
+                    len(static_el) - mb_size, device=el.device) % mb_size
+                static_el[mb_size:].copy_(el[pad_idxs])
+
+        if state['loss_mask'] is not None \
+                and state['mask_mb_size'] != mb_size:
+            state['loss_mask'][:mb_size].fill_(1)
+            state['loss_mask'][mb_size:].fill_(0)
+            state['mask_mb_size'] = mb_size
+
+    def _cuda_graph_key(self):
+        """Objects and hyperparameters the captured graph depends on.
+
+        The objects themselves are kept, so that they can be compared by
+        identity and their ids are never reused. Float hyperparameters are
+        baked into the captured optimizer step, while tensors are read from
+        their memory at each replay and only need to be the same objects.
+        """
+        return {
+            'optimizer': self.optimizer,
+            'optimizer_state': self.optimizer.state,
+            'params': [p for group in self.optimizer.param_groups
+                       for p in group['params']],
+            'hyperparams': [
+                {k: v for k, v in group.items() if k != 'params'}
+                for group in self.optimizer.param_groups
+            ],
+        }
+
+    def _cuda_graph_key_matches(self, key):
+        if key['optimizer'] is not self.optimizer \
+                or key['optimizer_state'] is not self.optimizer.state:
+            return False
+
+        params = [p for group in self.optimizer.param_groups
+                  for p in group['params']]
+        if len(params) != len(key['params']) or any(
+                p is not key_p for p, key_p in zip(params, key['params'])):
+            return False
+
+        groups = self.optimizer.param_groups
+        if len(groups) != len(key['hyperparams']):
+            return False
+        for group, key_hparams in zip(groups, key['hyperparams']):
+            hparams = {k: v for k, v in group.items() if k != 'params'}
+            if hparams.keys() != key_hparams.keys():
+                return False
+            for k, v in hparams.items():
+                key_v = key_hparams[k]
+                if isinstance(v, torch.Tensor) or \
+                        isinstance(key_v, torch.Tensor):
+                    if v is not key_v:
+                        return False
+                elif v != key_v:
+                    return False
+        return True
+
+    def _fits_static_mbatch(self, state):
+        """Whether the current mini-batch can be replayed by the graph."""
+        mbatch = self.mbatch
+        assert mbatch is not None
+        static_mbatch = state['static_mbatch']
+        if len(mbatch) != len(static_mbatch):
+            return False
+
+        mb_size = mbatch[0].shape[0]
+        static_mb_size = state['static_mb_size']
+        if mb_size != static_mb_size and not (
+                state['loss_mask'] is not None
+                and 0 < mb_size < static_mb_size):
+            return False
+
+        return all(
+            el.shape[0] == mb_size
+            and el.shape[1:] == static_el.shape[1:]
+            and el.dtype == static_el.dtype
+            for el, static_el in zip(mbatch, static_mbatch)
+        )
 
 
 __all__ = [
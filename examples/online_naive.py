@@ -79,6 +79,10 @@ def main(args):
 
     # MODEL CREATION
     model = SimpleMLP(num_classes=benchmark.n_classes)
+    if device.type == "cuda" and hasattr(torch, "compile"):
+        # tiny mini-batches are bound by kernel launches: use CUDA graphs
+        # and fused kernels to amortize them
+        model = torch.compile(model, mode="reduce-overhead", fullgraph=True)
 
     # choose some metrics and evaluation method
     interactive_logger = InteractiveLogger()
@@ -3,6 +3,7 @@ import os
 import copy
 
 import unittest
+from unittest import mock
 
 import pytorchcv.models.pyramidnet_cifar
 import torch
@@ -20,7 +21,11 @@ from avalanche.models import (
     NCMClassifier,
     TrainEvalModel,
     PNN,
+    MlpVAE,
+    VAE_loss,
 )
+import avalanche.models.generator as generator_module
+from avalanche.models.generator import VAEMLPDecoder
 from avalanche.models.dynamic_optimizers import (
     add_new_params_to_optimizer,
     update_optimizer,
@@ -676,5 +681,102 @@ class PNNTest(unittest.TestCase):
         model(mb1[0], task_labels=mb1[-1])
 
 
+class MlpVAETest(unittest.TestCase):
+    def test_forward_and_generate(self):
+        model = MlpVAE((1, 4, 4), nhid=2, n_classes=3)
+        x = torch.randn(5, 1, 4, 4)
+
+        x_hat, mean, logvar = model(x)
+        assert x_hat.shape == x.shape
+        assert mean.shape == (5, 2)
+        assert logvar.shape == (5, 2)
+
+        model.eval()
+        assert model.generate(6).shape == (6, 1, 4, 4)
+        assert model.generate().shape == (1, 4, 4)
+
+    def test_generate_backward(self):
+        model = MlpVAE((1, 4, 4), nhid=2)
+        model.eval()
+        a = model.generate(8)
+        b = model.generate(8)
+        (a.sum() + b.sum()).backward()
+        assert all(p.grad is not None for p in model.decoder.parameters())
+
+        with torch.no_grad():
+            a = model.generate(8)
+            assert model.generate(8).shape == a.shape
+
+    def test_compile_modules(self):
+        model = MlpVAE((1, 4, 4), nhid=2)
+        assert getattr(model.encoder, "_compiled_call_impl", None) is None
+        assert getattr(model.decoder, "_compiled_call_impl", None) is None
+
+    @unittest.skipUnless(
+        torch.cuda.is_available() and hasattr(torch.nn.Module, "compile"),
+        "CUDA or nn.Module.compile are not available")
+    def test_compile_modules_cuda(self):
+        model = MlpVAE((1, 4, 4), nhid=2, device="cuda")
+        assert model.encoder._compiled_call_impl is None
+
+        model = MlpVAE(
+            (1, 4, 4), nhid=2, device="cuda", compile_modules=True)
+        assert model.encoder._compiled_call_impl is not None
+        assert model.decoder._compiled_call_impl is not None
+
+    def test_conditional_decoder(self):
+        decoder = VAEMLPDecoder((1, 4, 4), nhid=5)
+        decoder.eval()
+        z, y = torch.randn(3, 2), torch.randn(3, 3)
+        assert decoder(z, y).shape == (3, 1, 4, 4)
+
+        decoder = VAEMLPDecoder((1, 4, 4), nhid=2)
+        decoder.eval()
+        assert decoder(z).shape == (3, 1, 4, 4)
+
+    def test_vae_loss(self):
+        x, x_hat = torch.rand(4, 1, 4, 4), torch.rand(4, 1, 4, 4)
+        mean, logvar = torch.randn(4, 2), torch.randn(4, 2)
+
+        expected = torch.sum((x_hat - x) ** 2) + 0.5 * torch.sum(
+            -1 - logvar + torch.exp(logvar) + mean ** 2
+        )
+        with mock.patch.object(generator_module, "_scripted_vae_loss", None):
+            loss = VAE_loss(x, (x_hat, mean, logvar))
+            assert torch.allclose(loss, expected)
+
+            # scripted on the first call only
+            scripted_loss = generator_module._scripted_vae_loss
+            assert scripted_loss is not None
+            VAE_loss(x, (x_hat, mean, logvar))
+            assert generator_module._scripted_vae_loss is scripted_loss
+
+    @unittest.skipUnless(torch.cuda.is_available(), "CUDA is not available")
+    def test_vae_loss_cuda(self):
+        x, x_hat = torch.rand(4, 1, 4, 4), torch.rand(4, 1, 4, 4)
+        mean, logvar = torch.randn(4, 2), torch.randn(4, 2)
+        expected = VAE_loss(x, (x_hat, mean, logvar))
+
+        forward_output = (x_hat.cuda(), mean.cuda(), logvar.cuda())
+        loss = VAE_loss(x.cuda(), forward_output)
+        assert torch.allclose(loss.cpu(), expected)
+
+        failing_compile = mock.Mock(side_effect=RuntimeError("no backend"))
+        with mock.patch.object(generator_module, "_compiled_vae_loss", None), \
+                mock.patch.object(
+                    generator_module, "_use_compiled_vae_loss", True), \
+                mock.patch.object(torch, "compile", failing_compile,
+                                  create=True):
+            with self.assertWarns(UserWarning):
+                loss = VAE_loss(x.cuda(), forward_output)
+            assert torch.allclose(loss.cpu(), expected)
+            assert not generator_module._use_compiled_vae_loss
+
+            # the scripted version is used without compiling again
+            loss = VAE_loss(x.cuda(), forward_output)
+            assert torch.allclose(loss.cpu(), expected)
+            assert failing_compile.call_count == 1
+
+
 if __name__ == "__main__":
     unittest.main()
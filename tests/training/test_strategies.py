@@ -11,10 +11,11 @@
 import os
 import sys
 import unittest
+from collections import defaultdict
 
 import torch
 from torch.nn import CrossEntropyLoss
-from torch.optim import SGD
+from torch.optim import SGD, Adam
 
 from avalanche.evaluation.metrics import StreamAccuracy, loss_metrics
 from avalanche.logging import TextLogger, InteractiveLogger
@@ -239,6 +240,165 @@ class BaseStrategyTest(unittest.TestCase):
             strategy.train(train_batch_info)
             assert strategy.clock.train_epoch_iterations == 11
 
+    def test_cuda_graph(self):
+        class CheckGraphP(SupervisedPlugin):
+            def __init__(self):
+                super().__init__()
+                self.n_replays = 0
+
+            def after_training_iteration(
+                self, strategy: "SupervisedTemplate", **kwargs
+            ):
+                assert torch.isfinite(strategy.loss).all()
+                state = strategy._cuda_graph_state
+                if state is not None and state['graph'] is not None:
+                    self.n_replays += 1
+
+        model = SimpleMLP(input_size=6, hidden_size=10)
+        optimizer = SGD(model.parameters(), lr=1e-3)
+        criterion = CrossEntropyLoss()
+        device = get_device()
+        plugin = CheckGraphP()
+
+        strategy = Naive(
+            model,
+            optimizer,
+            criterion,
+            train_mb_size=32,
+            device=device,
+            evaluator=None,
+            plugins=[plugin],
+        )
+        strategy.cuda_graph = True
+        benchmark = get_fast_benchmark()
+        strategy.train(benchmark.train_stream[0])
+
+        if torch.device(device).type == 'cuda':
+            assert plugin.n_replays > 0
+        else:
+            assert plugin.n_replays == 0
+        assert strategy._cuda_graph_state is None
+
+    @unittest.skipUnless(torch.cuda.is_available(), "CUDA is not available")
+    def test_cuda_graph_matches_eager(self):
+        benchmark = get_fast_benchmark(seed=1234)
+        all_params = []
+        for cuda_graph in (False, True):
+            torch.manual_seed(0)
+            model = SimpleMLP(input_size=6, hidden_size=10, drop_rate=0)
+            optimizer = SGD(model.parameters(), lr=0.1)
+            strategy = Naive(
+                model,
+                optimizer,
+                CrossEntropyLoss(),
+                train_mb_size=25,
+                train_epochs=2,
+                device="cuda",
+                evaluator=None,
+            )
+            strategy.cuda_graph = cuda_graph
+            strategy.train(benchmark.train_stream[0])
+            all_params.append([p.detach().cpu() for p in model.parameters()])
+
+        for eager_p, graph_p in zip(*all_params):
+            assert torch.allclose(eager_p, graph_p, atol=1e-5)
+
+    def test_cuda_graph_unsupported(self):
+        class ClipGradP(SupervisedPlugin):
+            def before_update(
+                self, strategy: "SupervisedTemplate", **kwargs
+            ):
+                torch.nn.utils.clip_grad_norm_(
+                    strategy.model.parameters(), 1.0)
+
+        model = SimpleMLP(input_size=6, hidden_size=10)
+        optimizer = SGD(model.parameters(), lr=1e-3)
+        strategy = Naive(model, optimizer, CrossEntropyLoss())
+        assert strategy._cuda_graph_unsupported_reason() is None
+
+        strategy = Naive(model, optimizer, CrossEntropyLoss(),
+                         plugins=[ClipGradP()])
+        reason = strategy._cuda_graph_unsupported_reason()
+        assert reason is not None and 'ClipGradP' in reason
+
+        optimizer = Adam(model.parameters(), lr=1e-3)
+        strategy = Naive(model, optimizer, CrossEntropyLoss())
+        if 'capturable' in optimizer.param_groups[0]:
+            reason = strategy._cuda_graph_unsupported_reason()
+            assert reason is not None and 'capturable' in reason
+
+            optimizer.param_groups[0]['capturable'] = True
+        assert strategy._cuda_graph_unsupported_reason() is None
+
+    def test_cuda_graph_key(self):
+        model = SimpleMLP(input_size=6, hidden_size=10)
+        optimizer = SGD(model.parameters(), lr=1e-3)
+        strategy = Naive(model, optimizer, CrossEntropyLoss())
+
+        key = strategy._cuda_graph_key()
+        assert strategy._cuda_graph_key_matches(key)
+
+        optimizer.param_groups[0]['lr'] = 1e-2
+        assert not strategy._cuda_graph_key_matches(key)
+
+        key = strategy._cuda_graph_key()
+        optimizer.state = defaultdict(dict)
+        assert not strategy._cuda_graph_key_matches(key)
+
+    def test_cuda_graph_masked_criterion(self):
+        model = SimpleMLP(input_size=6, hidden_size=10)
+        optimizer = SGD(model.parameters(), lr=1e-3)
+        strategy = Naive(model, optimizer, CrossEntropyLoss(), evaluator=None)
+        assert strategy._cuda_graph_supports_padding()
+
+        mb_x, mb_y = torch.randn(8, 6), torch.randint(0, 10, (8,))
+        strategy.mbatch = [mb_x, mb_y, torch.zeros(8, dtype=torch.long)]
+        strategy.mb_output = strategy.forward()
+        loss_mask = torch.tensor([1., 1., 1., 1., 1., 0., 0., 0.])
+
+        loss = strategy._masked_criterion(loss_mask)
+        expected = CrossEntropyLoss()(strategy.mb_output[:5], mb_y[:5])
+        assert torch.allclose(loss, expected)
+        assert strategy._criterion.reduction == 'mean'
+
+        mb_y[0] = -100
+        strategy._criterion = CrossEntropyLoss(ignore_index=-100)
+        loss = strategy._masked_criterion(loss_mask)
+        expected = CrossEntropyLoss(ignore_index=-100)(
+            strategy.mb_output[:5], mb_y[:5])
+        assert torch.allclose(loss, expected)
+
+        # class probabilities as targets, ignore_index is not used
+        mb_y = torch.softmax(torch.randn(8, 10), dim=1)
+        strategy.mbatch = [mb_x, mb_y, torch.zeros(8, dtype=torch.long)]
+        loss = strategy._masked_criterion(loss_mask)
+        expected = CrossEntropyLoss(ignore_index=-100)(
+            strategy.mb_output[:5], mb_y[:5])
+        assert torch.allclose(loss, expected)
+
+    def test_cuda_graph_padding_unsupported(self):
+        class CustomCriterionNaive(Naive):
+            def criterion(self):
+                return super().criterion() + 1.0
+
+        model = SimpleMLP(input_size=6, hidden_size=10)
+        optimizer = SGD(model.parameters(), lr=1e-3)
+        strategy = CustomCriterionNaive(
+            model, optimizer, CrossEntropyLoss(), evaluator=None)
+        assert not strategy._cuda_graph_supports_padding()
+
+        model = torch.nn.Sequential(
+            torch.nn.Linear(6, 10),
+            torch.nn.BatchNorm1d(10),
+            torch.nn.Linear(10, 10),
+        )
+        optimizer = SGD(model.parameters(), lr=1e-3)
+        strategy = Naive(model, optimizer, CrossEntropyLoss(), evaluator=None)
+        model.train()
+        assert not strategy._cuda_graph_supports_padding()
+        model.eval()
+        assert strategy._cuda_graph_supports_padding()
+
 
 class StrategyTest(unittest.TestCase):
     if "FAST_TEST" in os.environ: